@@ -0,0 +1,16 @@
+"""
+Celery application for background upload processing.
+
+Workers run with ``celery -A core worker``; configuration is read from Django
+settings prefixed with ``CELERY_``.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+app = Celery("core")
+app.config_from_object("django.conf:settings", namespace="CELERY")
+app.autodiscover_tasks()
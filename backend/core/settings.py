@@ -128,6 +128,8 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Copies uploads spilled to a temp dir on another filesystem with sendfile()
+DEFAULT_FILE_STORAGE = 'files.storage.SendfileStorage'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -146,6 +148,41 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Upload handlers hash the body as it is received so dedup never re-reads the upload
+FILE_UPLOAD_HANDLERS = [
+    'files.upload.HashingMemoryFileUploadHandler',
+    'files.upload.HashingTemporaryFileUploadHandler',
+]
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # Configure appropriately in production
 CORS_ALLOW_CREDENTIALS = True
+
+# Cache
+# Dedup keeps (size, fingerprint) -> original lookups here. LocMemCache is per process, so
+# deleting an original only clears the entry in the worker that served the DELETE; any
+# deployment with more than one worker process should set DJANGO_CACHE_URL
+# (e.g. redis://localhost:6379/1) so every worker shares and invalidates one cache
+if os.environ.get('DJANGO_CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['DJANGO_CACHE_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Background upload processing
+# When enabled, POST /api/files/ stages the upload and returns 202; a Celery worker
+# hashes and deduplicates it, and clients poll /api/uploads/<id>/ for the result
+FILE_UPLOAD_ASYNC = os.environ.get('DJANGO_ASYNC_UPLOADS', 'False') == 'True'
+# When enabled, deleting an original removes its stored bytes from a Celery worker
+FILE_DELETE_ASYNC = os.environ.get('DJANGO_ASYNC_DELETES', 'False') == 'True'
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_TASK_IGNORE_RESULT = True
+
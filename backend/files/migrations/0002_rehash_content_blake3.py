@@ -0,0 +1,28 @@
+from django.db import migrations
+import blake3
+
+
+def rehash_originals(apps, schema_editor):
+    # content_hash switched from SHA-256 to BLAKE3; old digests would never match new uploads
+    File = apps.get_model('files', 'File')
+    for file_obj in File.objects.filter(content_hash__isnull=False).iterator():
+        if not file_obj.file or not file_obj.file.storage.exists(file_obj.file.name):
+            continue
+
+        hasher = blake3.blake3()
+        with file_obj.file.open('rb') as f:
+            for chunk in f.chunks():
+                hasher.update(chunk)
+
+        File.objects.filter(id=file_obj.id).update(content_hash=hasher.hexdigest())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(rehash_originals, migrations.RunPython.noop),
+    ]
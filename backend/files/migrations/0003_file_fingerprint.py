@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-15 09:23
+
+from django.db import migrations, models
+import xxhash
+
+
+def backfill_fingerprints(apps, schema_editor):
+    File = apps.get_model('files', 'File')
+    for file_obj in File.objects.filter(is_duplicate=False).iterator():
+        if not file_obj.file or not file_obj.file.storage.exists(file_obj.file.name):
+            continue
+
+        hasher = xxhash.xxh3_128()
+        with file_obj.file.open('rb') as f:
+            for chunk in f.chunks():
+                hasher.update(chunk)
+
+        File.objects.filter(id=file_obj.id).update(fingerprint=hasher.hexdigest())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0002_rehash_content_blake3'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='fingerprint',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='file',
+            constraint=models.UniqueConstraint(fields=('fingerprint', 'size'), name='uniq_file_fingerprint_size'),
+        ),
+    ]
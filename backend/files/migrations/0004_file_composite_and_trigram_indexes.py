@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-15 09:26
+
+from django.db import migrations, models
+
+
+def create_filename_trigram_index(apps, schema_editor):
+    # pg_trgm only exists on PostgreSQL; other backends keep the plain btree index
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # Django compiles icontains to UPPER("original_filename") LIKE UPPER(%s), so index the same expression.
+    # CONCURRENTLY keeps uploads flowing while the index builds on an existing table.
+    schema_editor.execute(
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS file_filename_trgm_idx '
+        'ON files_file USING gin (UPPER("original_filename") gin_trgm_ops)'
+    )
+
+
+def drop_filename_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS file_filename_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('files', '0003_file_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['file_type', 'size', 'uploaded_at'], name='file_ftyp_size_upl_idx'),
+        ),
+        migrations.RunPython(create_filename_trigram_index, drop_filename_trigram_index),
+    ]
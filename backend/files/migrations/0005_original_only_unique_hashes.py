@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-15 09:28
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_hashes_to_duplicates(apps, schema_editor):
+    File = apps.get_model('files', 'File')
+    originals = File.objects.filter(id=OuterRef('referenced_file_id'))
+    File.objects.filter(is_duplicate=True).update(
+        content_hash=Subquery(originals.values('content_hash')[:1]),
+        fingerprint=Subquery(originals.values('fingerprint')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0004_file_composite_and_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='file',
+            name='uniq_file_fingerprint_size',
+        ),
+        migrations.AlterField(
+            model_name='file',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='file',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_duplicate', False)), fields=('fingerprint', 'size'), name='uniq_original_fingerprint_size'),
+        ),
+        migrations.AddConstraint(
+            model_name='file',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_duplicate', False)), fields=('content_hash',), name='uniq_original_hash'),
+        ),
+        migrations.RunPython(copy_hashes_to_duplicates, migrations.RunPython.noop),
+    ]
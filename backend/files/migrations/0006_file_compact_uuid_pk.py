@@ -0,0 +1,72 @@
+# Generated by Django 4.2.30 on 2026-10-15 09:29
+
+from django.db import migrations
+import files.models
+import uuid
+
+
+def _packed(value):
+    if value is None or isinstance(value, (bytes, memoryview)):
+        return value
+    return uuid.UUID(str(value)).bytes
+
+
+def unhex_mysql_ids(apps, schema_editor):
+    # MySQL's char(32) -> binary(16) conversion keeps the hex text, so the AlterField below
+    # would truncate it (or reject it in strict mode) before pack_existing_ids runs.
+    # Decode in place through varbinary columns wide enough for the hex first; the
+    # self-referencing foreign key has to come off while both ends change type.
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT constraint_name FROM information_schema.key_column_usage '
+            "WHERE table_schema = DATABASE() AND table_name = 'files_file' "
+            "AND column_name = 'referenced_file_id' AND referenced_table_name IS NOT NULL"
+        )
+        fk_names = [row[0] for row in cursor.fetchall()]
+    for fk_name in fk_names:
+        schema_editor.execute(f'ALTER TABLE files_file DROP FOREIGN KEY `{fk_name}`')
+    schema_editor.execute(
+        'ALTER TABLE files_file MODIFY id VARBINARY(32) NOT NULL, '
+        'MODIFY referenced_file_id VARBINARY(32) NULL'
+    )
+    schema_editor.execute(
+        'UPDATE files_file SET id = UNHEX(id), referenced_file_id = UNHEX(referenced_file_id)'
+    )
+    for fk_name in fk_names:
+        schema_editor.execute(
+            f'ALTER TABLE files_file ADD CONSTRAINT `{fk_name}` '
+            'FOREIGN KEY (referenced_file_id) REFERENCES files_file (id)'
+        )
+
+
+def pack_existing_ids(apps, schema_editor):
+    # Rows carried over from the char(32) column still hold hex text
+    connection = schema_editor.connection
+    if connection.features.has_native_uuid_field:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT id, referenced_file_id FROM files_file')
+        for file_id, referenced_file_id in cursor.fetchall():
+            cursor.execute(
+                'UPDATE files_file SET id = %s, referenced_file_id = %s WHERE id = %s',
+                [_packed(file_id), _packed(referenced_file_id), file_id],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0005_original_only_unique_hashes'),
+    ]
+
+    operations = [
+        migrations.RunPython(unhex_mysql_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='file',
+            name='id',
+            field=files.models.CompactUUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.RunPython(pack_existing_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-15 09:30
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_file_type_stats(apps, schema_editor):
+    File = apps.get_model('files', 'File')
+    FileTypeStat = apps.get_model('files', 'FileTypeStat')
+    counts = File.objects.order_by().values('file_type').annotate(count=Count('id'))
+    FileTypeStat.objects.bulk_create(
+        FileTypeStat(file_type=row['file_type'], count=row['count']) for row in counts
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0006_file_compact_uuid_pk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileTypeStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_type', models.CharField(max_length=100, unique=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['file_type'],
+            },
+        ),
+        migrations.RunPython(backfill_file_type_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-15 09:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+import files.models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0007_filetypestat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', files.models.CompactUUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('staged_file', models.FileField(blank=True, upload_to=files.models.staged_upload_path)),
+                ('original_filename', models.CharField(max_length=255)),
+                ('file_type', models.CharField(max_length=100)),
+                ('size', models.BigIntegerField()),
+                ('state', models.CharField(choices=[('pending', 'Pending'), ('deduped', 'Deduped'), ('committed', 'Committed'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('file', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_sessions', to='files.file')),
+            ],
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-15 09:33
+
+from django.db import migrations, models
+
+
+# Plain stand-ins for the partial unique constraints' indexes, e.g. on MySQL
+FALLBACK_INDEXES = {
+    'file_size_fprint_idx': ('size', 'fingerprint'),
+    'file_content_hash_idx': ('content_hash',),
+}
+
+
+def create_fallback_indexes(apps, schema_editor):
+    # This migration drops the size index and content_hash's db_index because the partial unique
+    # constraints cover those lookups. Backends without partial indexes skip the constraints
+    # entirely (models.W036), so keep plain indexes there instead. They cannot be unique since
+    # duplicates share their original's digests, so concurrent first uploads of the same bytes
+    # are not serialized on those backends.
+    if schema_editor.connection.features.supports_partial_indexes:
+        return
+    quote = schema_editor.quote_name
+    for name, columns in FALLBACK_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX {quote(name)} ON {quote("files_file")} '
+            f'({", ".join(quote(column) for column in columns)})'
+        )
+
+
+def drop_fallback_indexes(apps, schema_editor):
+    if schema_editor.connection.features.supports_partial_indexes:
+        return
+    quote = schema_editor.quote_name
+    for name in FALLBACK_INDEXES:
+        schema_editor.execute(schema_editor.sql_delete_index % {'table': quote('files_file'), 'name': quote(name)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0008_uploadsession'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='file',
+            name='uniq_original_fingerprint_size',
+        ),
+        migrations.RemoveIndex(
+            model_name='file',
+            name='files_file_size_6009e9_idx',
+        ),
+        migrations.AlterField(
+            model_name='file',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='file',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_duplicate', False)), fields=('size', 'fingerprint'), name='uniq_original_fingerprint_size'),
+        ),
+        migrations.RunPython(create_fallback_indexes, drop_fallback_indexes),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-15 09:40
+
+from django.db import migrations
+import files.models
+
+
+def _packed(value, length):
+    if value is None:
+        return None
+    if isinstance(value, memoryview):
+        value = value.tobytes()
+    if isinstance(value, bytes):
+        if len(value) == length:
+            return value
+        # PostgreSQL's text -> bytea cast keeps the ASCII hex characters
+        value = value.decode('ascii')
+    return bytes.fromhex(value)
+
+
+def unhex_mysql_digests(apps, schema_editor):
+    # MySQL's varchar -> binary(N) conversion keeps the hex text, so the AlterField below
+    # would truncate it (or reject it in strict mode) before pack_existing_digests runs.
+    # Decode in place through varbinary columns wide enough for the hex first.
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        'ALTER TABLE files_file MODIFY content_hash VARBINARY(64) NULL, '
+        'MODIFY fingerprint VARBINARY(32) NULL'
+    )
+    schema_editor.execute(
+        'UPDATE files_file SET content_hash = UNHEX(content_hash), fingerprint = UNHEX(fingerprint)'
+    )
+
+
+def pack_existing_digests(apps, schema_editor):
+    # Rows carried over from the varchar columns still hold hex text
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT id, content_hash, fingerprint FROM files_file '
+            'WHERE content_hash IS NOT NULL OR fingerprint IS NOT NULL'
+        )
+        for file_id, content_hash, fingerprint in cursor.fetchall():
+            cursor.execute(
+                'UPDATE files_file SET content_hash = %s, fingerprint = %s WHERE id = %s',
+                [_packed(content_hash, 32), _packed(fingerprint, 16), file_id],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0009_trim_redundant_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(unhex_mysql_digests, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='file',
+            name='content_hash',
+            field=files.models.HexDigestField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='file',
+            name='fingerprint',
+            field=files.models.HexDigestField(blank=True, max_length=32, null=True),
+        ),
+        migrations.RunPython(pack_existing_digests, migrations.RunPython.noop),
+    ]
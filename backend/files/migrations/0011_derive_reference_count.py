@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-15 09:42
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0010_binary_digests'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='file',
+            name='reference_count',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-15 09:58
+
+from django.db import migrations
+import files.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0011_derive_reference_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='content_hash',
+            field=files.models.HexDigestField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='fingerprint',
+            field=files.models.HexDigestField(blank=True, max_length=32, null=True),
+        ),
+    ]
@@ -1,4 +1,7 @@
+from django.core.exceptions import ValidationError
+from django.core.validators import RegexValidator
 from django.db import models
+from django.utils.functional import cached_property
 import uuid
 import os
 
@@ -7,18 +10,113 @@ def file_upload_path(instance, filename):
     filename = f"{uuid.uuid4()}.{ext}"
     return os.path.join('uploads', filename)
 
+def staged_upload_path(instance, filename):
+    ext = filename.split('.')[-1]
+    filename = f"{uuid.uuid4()}.{ext}"
+    return os.path.join('staging', filename)
+
+class CompactUUIDField(models.UUIDField):
+    # UUIDField is char(32) outside PostgreSQL; store the 16 raw bytes instead so the
+    # primary key and every foreign key index pointing at it are half the size
+    binary_db_types = {
+        'mysql': 'binary(16)',
+        'oracle': 'RAW(16)',
+        'sqlite': 'blob',
+    }
+    
+    def get_internal_type(self):
+        # Keeps backend converters that expect hex text away from the raw bytes
+        return 'CompactUUIDField'
+    
+    def db_type(self, connection):
+        if connection.features.has_native_uuid_field:
+            return connection.data_types['UUIDField']
+        return self.binary_db_types.get(connection.vendor, 'binary(16)')
+    
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is None:
+            return None
+        if not isinstance(value, uuid.UUID):
+            value = self.to_python(value)
+        if connection.features.has_native_uuid_field:
+            return value
+        return value.bytes
+    
+    def from_db_value(self, value, expression, connection):
+        if value is None or isinstance(value, uuid.UUID):
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return uuid.UUID(bytes=bytes(value))
+        return self.to_python(value)
+
+
+class HexDigestField(models.CharField):
+    # Digests are handled as hex strings in Python but stored as raw bytes, halving the
+    # column and its index and turning lookups into fixed-size binary compares
+    binary_db_types = {
+        'postgresql': 'bytea',
+        'mysql': 'binary(%(length)s)',
+        'oracle': 'RAW(%(length)s)',
+        'sqlite': 'blob',
+    }
+    
+    def get_internal_type(self):
+        # Keeps backend converters that expect text away from the raw bytes
+        return 'HexDigestField'
+    
+    def db_type(self, connection):
+        db_type = self.binary_db_types.get(connection.vendor, 'binary(%(length)s)')
+        return db_type % {'length': self.max_length // 2}
+    
+    @cached_property
+    def validators(self):
+        # Exactly max_length hex characters, so a malformed digest fails validation
+        # instead of bytes.fromhex() at the database layer
+        return [
+            *super().validators,
+            RegexValidator(
+                rf'\A[0-9a-f]{{{self.max_length}}}\Z',
+                message=f'Enter a {self.max_length}-character hexadecimal digest.',
+                code='invalid_digest',
+            ),
+        ]
+    
+    def to_python(self, value):
+        if value is None:
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return bytes(value).hex()
+        return super().to_python(value).lower()
+    
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is None or isinstance(value, (bytes, bytearray, memoryview)):
+            return value
+        try:
+            return bytes.fromhex(value)
+        except ValueError:
+            raise ValidationError(
+                f'Enter a {self.max_length}-character hexadecimal digest.', code='invalid_digest'
+            )
+    
+    def from_db_value(self, value, expression, connection):
+        if value is None or isinstance(value, str):
+            return value
+        return bytes(value).hex()
+
+
 class File(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     file = models.FileField(upload_to=file_upload_path)
     original_filename = models.CharField(max_length=255)
     file_type = models.CharField(max_length=100)
     size = models.BigIntegerField()
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
-    # content_hash is null for duplicates to avoid unique constraint violation
-    content_hash = models.CharField(max_length=64, unique=True, db_index=True, null=True, blank=True)
+    # Duplicates carry the same content_hash as their original; uniqueness only applies to originals
+    content_hash = HexDigestField(max_length=64, null=True, blank=True)
+    # Cheap xxh3-128 fingerprint used for the dedup lookup; content_hash is only computed on a match
+    fingerprint = HexDigestField(max_length=32, null=True, blank=True)
     is_duplicate = models.BooleanField(default=False)
-    reference_count = models.PositiveIntegerField(default=1)
     # PROTECT prevents deletion of original files that have duplicates
     referenced_file = models.ForeignKey(
         'self',
@@ -30,12 +128,82 @@ class File(models.Model):
     
     class Meta:
         ordering = ['-uploaded_at']
+        constraints = [
+            # Size leads so this also serves the size-only probe for originals during dedup
+            models.UniqueConstraint(
+                fields=['size', 'fingerprint'],
+                condition=models.Q(is_duplicate=False),
+                name='uniq_original_fingerprint_size',
+            ),
+            # Also the content_hash lookup index; every hash lookup is scoped to originals
+            models.UniqueConstraint(
+                fields=['content_hash'],
+                condition=models.Q(is_duplicate=False),
+                name='uniq_original_hash',
+            ),
+        ]
         indexes = [
             models.Index(fields=['original_filename']),
             models.Index(fields=['file_type']),
-            models.Index(fields=['size']),
             models.Index(fields=['uploaded_at']),
+            # Combined list filters (type + size range + date range) resolve in one index range scan
+            models.Index(fields=['file_type', 'size', 'uploaded_at'], name='file_ftyp_size_upl_idx'),
         ]
+        # On PostgreSQL, migration 0004 also adds a pg_trgm GIN index so ?search= (icontains) avoids a seq scan
+        # Backends without partial indexes (MySQL) skip both constraints; migration 0009 adds plain
+        # (size, fingerprint) and content_hash indexes there instead
     
     def __str__(self):
         return self.original_filename
+    
+    @property
+    def reference_count(self):
+        # Derived from the duplicates pointing here rather than stored, so uploads and deletes
+        # of duplicates never write to the original's row. Querysets that list many files
+        # annotate duplicate_count (see FileViewSet.get_queryset) to avoid a COUNT per row.
+        if self.is_duplicate:
+            return 1
+        duplicate_count = getattr(self, 'duplicate_count', None)
+        if duplicate_count is None:
+            duplicate_count = self.duplicates.count()
+        return 1 + duplicate_count
+
+
+class FileTypeStat(models.Model):
+    # Denormalized row count per file_type, kept current by the signals in signals.py
+    # so the type filter and totals never need a COUNT(*) over files
+    file_type = models.CharField(max_length=100, unique=True)
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['file_type']
+    
+    def __str__(self):
+        return f'{self.file_type}: {self.count}'
+
+
+class UploadSession(models.Model):
+    # An upload accepted for background processing (settings.FILE_UPLOAD_ASYNC)
+    class State(models.TextChoices):
+        PENDING = 'pending'      # bytes staged, waiting for a worker
+        DEDUPED = 'deduped'      # resolved to a duplicate of an existing original
+        COMMITTED = 'committed'  # stored as a new original
+        FAILED = 'failed'
+    
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    staged_file = models.FileField(upload_to=staged_upload_path, blank=True)
+    original_filename = models.CharField(max_length=255)
+    file_type = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+    # Digests the upload handlers computed while the request streamed in, handed on to the worker
+    content_hash = HexDigestField(max_length=64, null=True, blank=True)
+    fingerprint = HexDigestField(max_length=32, null=True, blank=True)
+    state = models.CharField(max_length=16, choices=State.choices, default=State.PENDING)
+    error = models.TextField(blank=True)
+    # The File row produced once processing finishes
+    file = models.ForeignKey(File, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_sessions')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f'{self.original_filename} ({self.state})'
+
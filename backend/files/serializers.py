@@ -1,13 +1,53 @@
+from django.utils.encoding import filepath_to_uri
+from django.utils.functional import cached_property
 from rest_framework import serializers
-from .models import File
+from .models import File, UploadSession
 
 class FileSerializer(serializers.ModelSerializer):
-    referenced_file_id = serializers.UUIDField(source='referenced_file.id', read_only=True, allow_null=True)
+    # Reads the FK column directly; source='referenced_file.id' would fetch the original per row
+    referenced_file_id = serializers.UUIDField(read_only=True, allow_null=True)
     
     class Meta:
         model = File
         fields = [
             'id', 'file', 'original_filename', 'file_type', 'size', 'uploaded_at',
-            'content_hash', 'is_duplicate', 'reference_count', 'referenced_file_id'
+            'content_hash', 'fingerprint', 'is_duplicate', 'reference_count', 'referenced_file_id'
         ]
-        read_only_fields = ['id', 'uploaded_at', 'referenced_file_id'] 
\ No newline at end of file
+        # The digests are the dedup key: only ingest_upload computes them
+        read_only_fields = ['id', 'uploaded_at', 'content_hash', 'fingerprint', 'referenced_file_id']
+
+
+class FileListSerializer(FileSerializer):
+    # Collection endpoint: skips the internal fingerprint and resolves the absolute media URL
+    # once per response instead of once per row
+    file = serializers.SerializerMethodField()
+    
+    class Meta(FileSerializer.Meta):
+        fields = [field for field in FileSerializer.Meta.fields if field != 'fingerprint']
+    
+    @cached_property
+    def _media_base_url(self):
+        storage = File._meta.get_field('file').storage
+        base_url = getattr(storage, 'base_url', None)
+        if base_url is None:
+            return None
+        request = self.context.get('request')
+        return request.build_absolute_uri(base_url) if request else base_url
+    
+    def get_file(self, obj):
+        if not obj.file:
+            return None
+        if self._media_base_url is None:
+            # Non-filesystem storage: let the backend build the URL
+            return obj.file.url
+        return self._media_base_url + filepath_to_uri(obj.file.name)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    file = FileSerializer(read_only=True)
+    
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'state', 'original_filename', 'file_type', 'size', 'created_at', 'error', 'file']
+        read_only_fields = fields
+
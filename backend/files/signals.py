@@ -0,0 +1,38 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .models import File, FileTypeStat
+
+
+def _increment(file_type):
+    FileTypeStat.objects.get_or_create(file_type=file_type)
+    # F() keeps concurrent uploads of the same type from losing increments
+    FileTypeStat.objects.filter(file_type=file_type).update(count=F('count') + 1)
+
+
+def _decrement(file_type):
+    FileTypeStat.objects.filter(file_type=file_type, count__gt=0).update(count=F('count') - 1)
+
+
+@receiver(pre_save, sender=File)
+def remember_previous_file_type(sender, instance, **kwargs):
+    # An update can move the row to another type; post_save needs the old one to move the count
+    if instance._state.adding:
+        return
+    instance._previous_file_type = File.objects.filter(pk=instance.pk).values_list('file_type', flat=True).first()
+
+
+@receiver(post_save, sender=File)
+def increment_file_type_count(sender, instance, created, **kwargs):
+    if created:
+        _increment(instance.file_type)
+        return
+    previous = instance.__dict__.pop('_previous_file_type', None)
+    if previous is not None and previous != instance.file_type:
+        _decrement(previous)
+        _increment(instance.file_type)
+
+
+@receiver(post_delete, sender=File)
+def decrement_file_type_count(sender, instance, **kwargs):
+    _decrement(instance.file_type)
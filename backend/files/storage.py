@@ -0,0 +1,71 @@
+import os
+import tempfile
+from django.core.files import File as DjangoFile
+from django.core.files.storage import FileSystemStorage
+
+
+# Bytes handed to each sendfile() call
+SENDFILE_CHUNK_SIZE = 1 << 24
+
+
+class _StagedCopy(DjangoFile):
+    # Looks like a spilled upload so FileSystemStorage renames it into place instead of copying
+    def __init__(self, path, name):
+        super().__init__(open(path, 'rb'), name)
+        self._path = path
+
+    def temporary_file_path(self):
+        return self._path
+
+
+class SendfileStorage(FileSystemStorage):
+    """
+    FileSystemStorage that copies spilled uploads in-kernel.
+
+    A TemporaryUploadedFile is normally renamed into MEDIA_ROOT. When the temp
+    directory is on another filesystem Django falls back to a Python read/write
+    loop; here the bytes are instead copied with os.sendfile() onto the media
+    filesystem first, and that copy is renamed into place.
+    """
+
+    def _save(self, name, content):
+        if not hasattr(content, 'temporary_file_path') or not hasattr(os, 'sendfile'):
+            return super()._save(name, content)
+
+        source_path = content.temporary_file_path()
+        if self._on_media_filesystem(source_path):
+            # The default rename already moves no bytes
+            return super()._save(name, content)
+
+        staged_path = self._sendfile_copy(source_path)
+        staged = _StagedCopy(staged_path, content.name)
+        try:
+            return super()._save(name, staged)
+        finally:
+            staged.close()
+            if os.path.exists(staged_path):
+                os.remove(staged_path)
+
+    def _on_media_filesystem(self, path):
+        os.makedirs(self.location, exist_ok=True)
+        return os.stat(path).st_dev == os.stat(self.location).st_dev
+
+    def _sendfile_copy(self, source_path):
+        fd, staged_path = tempfile.mkstemp(dir=self.location, prefix='.upload-')
+        try:
+            with open(source_path, 'rb') as source:
+                source_fd = source.fileno()
+                remaining = os.fstat(source_fd).st_size
+                offset = 0
+                while remaining > 0:
+                    sent = os.sendfile(fd, source_fd, offset, min(remaining, SENDFILE_CHUNK_SIZE))
+                    if sent == 0:
+                        break
+                    offset += sent
+                    remaining -= sent
+        except BaseException:
+            os.close(fd)
+            os.remove(staged_path)
+            raise
+        os.close(fd)
+        return staged_path
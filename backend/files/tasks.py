@@ -0,0 +1,55 @@
+from celery import shared_task
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from .models import File, UploadSession
+
+
+@shared_task
+def finalize_upload(session_id):
+    """Hash and deduplicate a staged upload, then record the outcome on its session."""
+    # Imported here: views imports this module to enqueue the task
+    from .views import ingest_upload
+    
+    storage = UploadSession._meta.get_field('staged_file').storage
+    try:
+        # Ingest and session update commit together, so a worker dying in between can't leave a
+        # committed File behind a PENDING session that a redelivery would ingest again
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().get(id=session_id)
+            if session.state != UploadSession.State.PENDING:
+                # Redelivered message for a session that was already processed
+                return
+            
+            with session.staged_file.open('rb') as staged:
+                upload = UploadedFile(
+                    staged,
+                    name=session.original_filename,
+                    content_type=session.file_type,
+                    size=session.size,
+                )
+                # Same attributes the hashing upload handlers set, so ingest_upload skips rehashing
+                upload.fingerprint = session.fingerprint
+                upload.content_hash = session.content_hash
+                instance = ingest_upload(upload)
+            
+            staged_name = session.staged_file.name
+            session.staged_file = ''
+            session.file = instance
+            session.state = UploadSession.State.DEDUPED if instance.is_duplicate else UploadSession.State.COMMITTED
+            session.save(update_fields=['staged_file', 'file', 'state'])
+            transaction.on_commit(lambda: storage.delete(staged_name))
+    except Exception as exc:
+        # Nothing retries a failed session, so its staged bytes would otherwise never be removed
+        staged_name = UploadSession.objects.filter(id=session_id).values_list('staged_file', flat=True).first()
+        UploadSession.objects.filter(id=session_id).update(
+            state=UploadSession.State.FAILED, error=str(exc), staged_file=''
+        )
+        if staged_name:
+            storage.delete(staged_name)
+        raise
+
+@shared_task
+def delete_stored_file(name):
+    """Remove a deleted original's bytes from storage."""
+    # Storage.delete() ignores missing files, so redelivered messages are harmless
+    File._meta.get_field('file').storage.delete(name)
@@ -1,14 +1,25 @@
+import blake3
+import json
 import os
 import tempfile
+import uuid
+from unittest import mock
 from io import BytesIO
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase, override_settings
-from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test.utils import CaptureQueriesContext
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
 from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import File
-from .views import compute_file_hash
+from .models import File, FileTypeStat, UploadSession
+from .storage import SendfileStorage
+from .tasks import delete_stored_file, finalize_upload
+from .views import compute_file_hash, compute_file_fingerprint, parse_iso_datetime
 
 
 MEDIA_ROOT = tempfile.mkdtemp()
@@ -19,6 +30,8 @@ class FileDeduplicationTests(TestCase):
     
     def setUp(self):
         self.client = APIClient()
+        # Cached dedup candidates would point at rows rolled back by earlier tests
+        cache.clear()
     
     def tearDown(self):
         # Delete duplicates first due to PROTECT constraint on referenced_file
@@ -50,7 +63,9 @@ class FileDeduplicationTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         data = response.json()
         self.assertFalse(data['is_duplicate'])
-        self.assertIsNotNone(data['content_hash'])
+        # Both digests come from the upload handler, so the stored file never has to be read back
+        self.assertEqual(data['fingerprint'], compute_file_fingerprint(BytesIO(file_content)))
+        self.assertEqual(data['content_hash'], compute_file_hash(BytesIO(file_content)))
         self.assertEqual(data['reference_count'], 1)
         self.assertIsNone(data['referenced_file_id'])
         
@@ -76,12 +91,15 @@ class FileDeduplicationTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         data = response.json()
         self.assertTrue(data['is_duplicate'])
-        self.assertIsNone(data['content_hash'])
+        self.assertEqual(data['content_hash'], compute_file_hash(BytesIO(original_content)))
+        self.assertEqual(data['fingerprint'], compute_file_fingerprint(BytesIO(original_content)))
         self.assertEqual(data['referenced_file_id'], original_id)
         
         original_file_obj = File.objects.get(id=original_id)
         original_file_obj.refresh_from_db()
         self.assertEqual(original_file_obj.reference_count, 2)
+        self.assertEqual(original_file_obj.fingerprint, compute_file_fingerprint(BytesIO(original_content)))
+        self.assertEqual(original_file_obj.content_hash, compute_file_hash(BytesIO(original_content)))
         
         duplicate_file_obj = File.objects.get(id=data['id'])
         self.assertEqual(duplicate_file_obj.file.name, original_file_obj.file.name)
@@ -165,6 +183,241 @@ class FileDeduplicationTests(TestCase):
                         "All uploads should return 201, any IntegrityError should be handled internally")
 
 
+    def test_dedup_006_fingerprint_collision_with_different_content_creates_original(self):
+        first = self.client.post('/api/files/', {'file': self._create_test_file(content=b'aaaa')}, format='multipart')
+        # Simulate an xxh3 collision: the stored original claims the fingerprint of different bytes
+        File.objects.filter(id=first.json()['id']).update(
+            fingerprint=compute_file_fingerprint(BytesIO(b'bbbb'))
+        )
+        
+        second = self.client.post('/api/files/', {'file': self._create_test_file(content=b'bbbb')}, format='multipart')
+        
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(second.json()['is_duplicate'])
+        self.assertIsNone(second.json()['fingerprint'])
+        self.assertEqual(File.objects.filter(is_duplicate=False).count(), 2)
+        self.assertIsNotNone(File.objects.get(id=first.json()['id']).content_hash)
+
+
+    def test_dedup_007_duplicate_upload_writes_nothing_to_storage(self):
+        content = b'stored once'
+        self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart')
+        uploads_dir = os.path.join(MEDIA_ROOT, 'uploads')
+        files_before = set(os.listdir(uploads_dir))
+        
+        response = self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart')
+        
+        self.assertTrue(response.json()['is_duplicate'])
+        self.assertEqual(set(os.listdir(uploads_dir)), files_before)
+    
+    def test_dedup_011_upload_is_hashed_by_upload_handler_not_reread(self):
+        content = b'hashed while streaming'
+        self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart')
+        
+        with mock.patch('files.views.compute_file_fingerprint', wraps=compute_file_fingerprint) as fingerprint_mock, \
+                mock.patch('files.views.compute_file_hash', wraps=compute_file_hash) as hash_mock:
+            response = self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart')
+        
+        self.assertTrue(response.json()['is_duplicate'])
+        # Both uploads were hashed by the handler, so neither they nor the stored original are re-read
+        self.assertEqual(fingerprint_mock.call_count, 0)
+        self.assertEqual(hash_mock.call_count, 0)
+        self.assertEqual(response.json()['content_hash'], blake3.blake3(content).hexdigest())
+    
+    def test_dedup_012_upload_losing_insert_race_becomes_duplicate(self):
+        self.client.post('/api/files/', {'file': self._create_test_file(content=b'aaaa')}, format='multipart')
+        content = b'bbbb'
+        storage = File._meta.get_field('file').storage
+        real_save = storage.save
+        
+        def save_after_competitor(name, content_file, *args, **kwargs):
+            # A concurrent upload of the same bytes commits its original between our lookup and insert
+            File.objects.create(
+                original_filename='competitor.txt',
+                file_type='text/plain',
+                size=len(content),
+                fingerprint=compute_file_fingerprint(BytesIO(content)),
+                file=real_save('competitor.txt', ContentFile(content)),
+            )
+            return real_save(name, content_file, *args, **kwargs)
+        
+        with mock.patch.object(storage, 'save', side_effect=save_after_competitor):
+            response = self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.json()['is_duplicate'])
+        competitor = File.objects.get(original_filename='competitor.txt')
+        self.assertEqual(str(competitor.id), response.json()['referenced_file_id'])
+        self.assertEqual(File.objects.filter(is_duplicate=False).count(), 2)
+
+
+    @override_settings(FILE_UPLOAD_ASYNC=True)
+    def test_dedup_008_async_upload_is_finalized_by_background_task(self):
+        content = b'processed in the background'
+        
+        with mock.patch.object(finalize_upload, 'delay', side_effect=finalize_upload), \
+                mock.patch('files.views.compute_file_hash', wraps=compute_file_hash) as hash_mock, \
+                mock.patch('files.views.compute_file_fingerprint', wraps=compute_file_fingerprint) as fingerprint_mock, \
+                self.captureOnCommitCallbacks(execute=True):
+            first = self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart')
+            second = self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart')
+        
+        # The worker reuses the digests the upload handlers stored on the session
+        self.assertEqual(hash_mock.call_count, 0)
+        self.assertEqual(fingerprint_mock.call_count, 0)
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(first.json()['state'], 'pending')
+        
+        first_session = self.client.get(f"/api/uploads/{first.json()['id']}/").json()
+        second_session = self.client.get(f"/api/uploads/{second.json()['id']}/").json()
+        self.assertEqual(first_session['state'], 'committed')
+        self.assertEqual(second_session['state'], 'deduped')
+        self.assertEqual(second_session['file']['referenced_file_id'], first_session['file']['id'])
+        self.assertFalse(UploadSession.objects.exclude(staged_file='').exists())
+    
+    @override_settings(FILE_UPLOAD_ASYNC=True)
+    def test_dedup_019_failed_background_upload_removes_staged_file(self):
+        with mock.patch.object(finalize_upload, 'delay'):
+            response = self.client.post('/api/files/', {'file': self._create_test_file()}, format='multipart')
+        session = UploadSession.objects.get(id=response.json()['id'])
+        staged_path = session.staged_file.path
+        
+        with mock.patch('files.views.ingest_upload', side_effect=OSError('disk full')), \
+                self.assertRaises(OSError):
+            finalize_upload(str(session.id))
+        
+        session.refresh_from_db()
+        self.assertEqual(session.state, UploadSession.State.FAILED)
+        self.assertEqual(session.error, 'disk full')
+        self.assertFalse(session.staged_file)
+        self.assertFalse(os.path.exists(staged_path))
+        self.assertFalse(File.objects.exists())
+    
+    @override_settings(FILE_DELETE_ASYNC=True)
+    def test_dedup_013_deleting_original_removes_stored_file_after_commit(self):
+        response = self.client.post('/api/files/', {'file': self._create_test_file()}, format='multipart')
+        instance = File.objects.get(id=response.json()['id'])
+        stored_path = instance.file.path
+        
+        with mock.patch.object(delete_stored_file, 'delay', side_effect=delete_stored_file) as delay_mock, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/files/{instance.id}/')
+            # Nothing is removed from storage until the transaction commits
+            self.assertTrue(os.path.exists(stored_path))
+        
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        delay_mock.assert_called_once_with(instance.file.name)
+        self.assertFalse(os.path.exists(stored_path))
+    
+    def test_dedup_014_duplicate_response_matches_detail_output(self):
+        content = b'same response either way'
+        self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart')
+        
+        response = self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        detail = self.client.get(f"/api/files/{response.json()['id']}/").json()
+        self.assertEqual(response.json(), detail)
+    
+    def test_dedup_015_cached_original_skips_dedup_lookups(self):
+        content = b'popular file'
+        first = self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart')
+        # The original was stored with its handler digests and cached as the dedup candidate
+        self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart')
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart')
+        # Only a primary-key check that the cached original still exists: no size probe or candidate SELECT
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and 'FROM "files_file"' in q['sql']]
+        self.assertEqual(len(selects), 1)
+        self.assertIn('"files_file"."id" =', selects[0])
+        self.assertEqual(response.json()['referenced_file_id'], first.json()['id'])
+        
+        # A stale entry for an original deleted behind the cache's back falls back to the database
+        File.objects.filter(is_duplicate=True).delete()
+        File.objects.all().delete()
+        response = self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.json()['is_duplicate'])
+    
+    def test_dedup_017_deleting_duplicate_releases_original(self):
+        content = b'counted from duplicates'
+        original = self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart').json()
+        duplicate = self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart').json()
+        
+        self.assertEqual(self.client.get(f"/api/files/{original['id']}/").json()['reference_count'], 2)
+        self.assertEqual(self.client.delete(f"/api/files/{original['id']}/").status_code, status.HTTP_403_FORBIDDEN)
+        
+        self.client.delete(f"/api/files/{duplicate['id']}/")
+        
+        self.assertEqual(self.client.get(f"/api/files/{original['id']}/").json()['reference_count'], 1)
+        self.assertEqual(self.client.delete(f"/api/files/{original['id']}/").status_code, status.HTTP_204_NO_CONTENT)
+    
+    def test_dedup_018_racing_unhashed_originals_are_merged(self):
+        # Two background uploads of the same bytes both passed the size check and were stored unhashed
+        content = b'raced past the size check'
+        storage = File._meta.get_field('file').storage
+        first, second = [
+            File.objects.create(
+                original_filename=f'copy_{i}.txt',
+                file_type='text/plain',
+                size=len(content),
+                file=storage.save(f'uploads/copy_{i}.txt', ContentFile(content)),
+            )
+            for i in range(2)
+        ]
+        stored_paths = {first.id: first.file.path, second.id: second.file.path}
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart')
+        
+        self.assertTrue(response.json()['is_duplicate'])
+        self.assertEqual(File.objects.filter(size=len(content), is_duplicate=False).count(), 1)
+        owner = File.objects.get(size=len(content), is_duplicate=False)
+        loser = second if owner.id == first.id else first
+        loser.refresh_from_db()
+        self.assertEqual(loser.referenced_file_id, owner.id)
+        self.assertEqual(loser.file.name, owner.file.name)
+        self.assertEqual(owner.reference_count, 3)
+        self.assertFalse(os.path.exists(stored_paths[loser.id]))
+        self.assertTrue(os.path.exists(stored_paths[owner.id]))
+    
+    def test_dedup_021_unhashed_original_with_missing_file_is_skipped(self):
+        content = b'stored file went missing'
+        File.objects.create(
+            original_filename='gone.txt',
+            file_type='text/plain',
+            size=len(content),
+            file='uploads/gone.txt',
+        )
+        
+        response = self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.json()['is_duplicate'])
+        self.assertEqual(File.objects.filter(size=len(content), is_duplicate=False).count(), 2)
+
+    
+    def test_dedup_022_digests_are_read_only_and_validated(self):
+        content = b'dedup key stays put'
+        response = self.client.post('/api/files/', {'file': self._create_test_file(content=content)}, format='multipart')
+        original = response.json()
+        
+        for payload in ({'fingerprint': 'zz'}, {'content_hash': '0' * 64, 'fingerprint': '0' * 32}):
+            patched = self.client.patch(f"/api/files/{original['id']}/", payload, format='json')
+            self.assertEqual(patched.status_code, status.HTTP_200_OK)
+            self.assertEqual(patched.json()['content_hash'], original['content_hash'])
+            self.assertEqual(patched.json()['fingerprint'], original['fingerprint'])
+        
+        instance = File.objects.get(id=original['id'])
+        for value in ('zz' * 16, 'ab'):
+            instance.fingerprint = value
+            with self.assertRaises(ValidationError):
+                instance.full_clean()
+        instance.fingerprint = original['fingerprint'].upper()
+        instance.full_clean()
+        self.assertEqual(instance.fingerprint, original['fingerprint'])
+
 class FileHashComputationTests(TestCase):
     
     def test_dedup_005_hash_computation_preserves_file_pointer(self):
@@ -187,6 +440,61 @@ class FileHashComputationTests(TestCase):
         file_obj.seek(0)
         hash_value_2 = compute_file_hash(file_obj)
         self.assertEqual(hash_value, hash_value_2, "Hash should be consistent")
+    
+    def test_dedup_009_threaded_hash_matches_single_threaded_hash(self):
+        content = os.urandom(1 << 16)
+        upload = SimpleUploadedFile(name='big.bin', content=content)
+        
+        with mock.patch('files.views.BLAKE3_THREADED_MIN_SIZE', 1 << 10):
+            threaded_hash = compute_file_hash(upload)
+        
+        self.assertEqual(threaded_hash, blake3.blake3(content).hexdigest())
+    
+    def test_dedup_020_stored_file_without_size_uses_threaded_hash(self):
+        content = os.urandom(1 << 16)
+        with tempfile.NamedTemporaryFile() as stored:
+            stored.write(content)
+            stored.flush()
+            stored.seek(0)
+            
+            with mock.patch('files.views.BLAKE3_THREADED_MIN_SIZE', 1 << 10), \
+                    mock.patch('files.views.blake3.blake3', wraps=blake3.blake3) as blake3_mock:
+                hash_value = compute_file_hash(stored.file)
+        
+        self.assertIn('max_threads', blake3_mock.call_args.kwargs)
+        self.assertEqual(hash_value, blake3.blake3(content).hexdigest())
+    
+    def test_dedup_010_hash_of_spilled_upload_matches_content(self):
+        content = b'spilled to disk' * 1000
+        upload = TemporaryUploadedFile('big.bin', 'application/octet-stream', len(content), None)
+        upload.write(content)
+        upload.seek(10)
+        
+        try:
+            hash_value = compute_file_hash(upload)
+            self.assertEqual(hash_value, blake3.blake3(content).hexdigest())
+            self.assertEqual(upload.tell(), 10, "File position should be preserved after hash computation")
+        finally:
+            upload.close()
+    
+    def test_dedup_016_cross_filesystem_upload_is_copied_with_sendfile(self):
+        content = b'moved across filesystems' * 1000
+        upload = TemporaryUploadedFile('big.bin', 'application/octet-stream', len(content), None)
+        upload.write(content)
+        upload.seek(0)
+        storage = SendfileStorage(location=tempfile.mkdtemp())
+        
+        try:
+            with mock.patch.object(SendfileStorage, '_on_media_filesystem', return_value=False), \
+                    mock.patch('files.storage.os.sendfile', wraps=os.sendfile) as sendfile_mock:
+                name = storage.save('uploads/big.bin', upload)
+        finally:
+            upload.close()
+        
+        self.assertTrue(sendfile_mock.called)
+        with storage.open(name, 'rb') as stored:
+            self.assertEqual(stored.read(), content)
+        self.assertEqual(os.listdir(os.path.join(storage.location)), ['uploads'])
 
 
 @override_settings(MEDIA_ROOT=MEDIA_ROOT)
@@ -194,6 +502,8 @@ class FileSearchAndFilteringTests(TestCase):
     
     def setUp(self):
         self.client = APIClient()
+        # Cached dedup candidates would point at rows rolled back by earlier tests
+        cache.clear()
     
     def tearDown(self):
         # Delete duplicates first due to PROTECT constraint on referenced_file
@@ -226,6 +536,29 @@ class FileSearchAndFilteringTests(TestCase):
         file_obj.save()
         return file_obj
     
+    def _seed_files(self, specs):
+        # Filter tests only need rows, so skip the upload/hash/dedup path and insert them in one query
+        files = [
+            File(
+                original_filename=spec['original_filename'],
+                file_type=spec.get('file_type', 'text/plain'),
+                size=spec.get('size', 100),
+                content_hash=uuid.uuid4().hex + uuid.uuid4().hex,
+            )
+            for spec in specs
+        ]
+        File.objects.bulk_create(files)
+        
+        # auto_now_add overwrites uploaded_at on insert, so dates are applied in a single follow-up UPDATE
+        dated = []
+        for file_obj, spec in zip(files, specs):
+            if 'uploaded_at' in spec:
+                file_obj.uploaded_at = timezone.make_aware(spec['uploaded_at'])
+                dated.append(file_obj)
+        if dated:
+            File.objects.bulk_update(dated, ['uploaded_at'])
+        return files
+    
     def test_search_001_search_by_filename_substring_case_insensitive(self):
         self._create_test_file(content=b'content1', filename='test.pdf', content_type='application/pdf')
         self._create_test_file(content=b'content2', filename='TEST.txt', content_type='text/plain')
@@ -269,23 +602,11 @@ class FileSearchAndFilteringTests(TestCase):
         self.assertNotIn('c.txt', filenames)
     
     def test_search_003_filter_by_size_min(self):
-        file1 = self._create_test_file(content=b'x' * 100, filename='small.txt')
-        response1 = self.client.post('/api/files/', {'file': file1}, format='multipart')
-        file1_obj = File.objects.get(id=response1.json()['id'])
-        file1_obj.size = 100
-        file1_obj.save()
-        
-        file2 = self._create_test_file(content=b'x' * 500, filename='medium.txt')
-        response2 = self.client.post('/api/files/', {'file': file2}, format='multipart')
-        file2_obj = File.objects.get(id=response2.json()['id'])
-        file2_obj.size = 500
-        file2_obj.save()
-        
-        file3 = self._create_test_file(content=b'x' * 1000, filename='large.txt')
-        response3 = self.client.post('/api/files/', {'file': file3}, format='multipart')
-        file3_obj = File.objects.get(id=response3.json()['id'])
-        file3_obj.size = 1000
-        file3_obj.save()
+        self._seed_files([
+            {'original_filename': 'small.txt', 'size': 100},
+            {'original_filename': 'medium.txt', 'size': 500},
+            {'original_filename': 'large.txt', 'size': 1000},
+        ])
         
         response = self.client.get('/api/files/', {'size_min': '500'})
         
@@ -298,23 +619,11 @@ class FileSearchAndFilteringTests(TestCase):
         self.assertNotIn(100, sizes)
     
     def test_search_004_filter_by_size_max(self):
-        file1 = self._create_test_file(content=b'x' * 100, filename='small.txt')
-        response1 = self.client.post('/api/files/', {'file': file1}, format='multipart')
-        file1_obj = File.objects.get(id=response1.json()['id'])
-        file1_obj.size = 100
-        file1_obj.save()
-        
-        file2 = self._create_test_file(content=b'x' * 500, filename='medium.txt')
-        response2 = self.client.post('/api/files/', {'file': file2}, format='multipart')
-        file2_obj = File.objects.get(id=response2.json()['id'])
-        file2_obj.size = 500
-        file2_obj.save()
-        
-        file3 = self._create_test_file(content=b'x' * 1000, filename='large.txt')
-        response3 = self.client.post('/api/files/', {'file': file3}, format='multipart')
-        file3_obj = File.objects.get(id=response3.json()['id'])
-        file3_obj.size = 1000
-        file3_obj.save()
+        self._seed_files([
+            {'original_filename': 'small.txt', 'size': 100},
+            {'original_filename': 'medium.txt', 'size': 500},
+            {'original_filename': 'large.txt', 'size': 1000},
+        ])
         
         response = self.client.get('/api/files/', {'size_max': '500'})
         
@@ -327,25 +636,11 @@ class FileSearchAndFilteringTests(TestCase):
         self.assertNotIn(1000, sizes)
     
     def test_search_005_filter_by_uploaded_after_date(self):
-        date1 = datetime(2024, 1, 1, 12, 0, 0)
-        date2 = datetime(2024, 1, 15, 12, 0, 0)
-        date3 = datetime(2024, 2, 1, 12, 0, 0)
-        
-        file1 = self._create_test_file(content=b'content1', filename='file1.txt')
-        response1 = self.client.post('/api/files/', {'file': file1}, format='multipart')
-        file1_obj = File.objects.get(id=response1.json()['id'])
-        # update() bypasses auto_now_add
-        File.objects.filter(id=file1_obj.id).update(uploaded_at=timezone.make_aware(date1))
-        
-        file2 = self._create_test_file(content=b'content2', filename='file2.txt')
-        response2 = self.client.post('/api/files/', {'file': file2}, format='multipart')
-        file2_obj = File.objects.get(id=response2.json()['id'])
-        File.objects.filter(id=file2_obj.id).update(uploaded_at=timezone.make_aware(date2))
-        
-        file3 = self._create_test_file(content=b'content3', filename='file3.txt')
-        response3 = self.client.post('/api/files/', {'file': file3}, format='multipart')
-        file3_obj = File.objects.get(id=response3.json()['id'])
-        File.objects.filter(id=file3_obj.id).update(uploaded_at=timezone.make_aware(date3))
+        self._seed_files([
+            {'original_filename': 'file1.txt', 'uploaded_at': datetime(2024, 1, 1, 12, 0, 0)},
+            {'original_filename': 'file2.txt', 'uploaded_at': datetime(2024, 1, 15, 12, 0, 0)},
+            {'original_filename': 'file3.txt', 'uploaded_at': datetime(2024, 2, 1, 12, 0, 0)},
+        ])
         
         response = self.client.get('/api/files/', {'uploaded_after': '2024-01-15'})
         
@@ -358,26 +653,12 @@ class FileSearchAndFilteringTests(TestCase):
         self.assertNotIn('file1.txt', filenames)
     
     def test_search_006_filter_by_uploaded_before_date(self):
-        # Use start of day to ensure inclusion (view converts date to end of day for <= comparison)
-        date1 = datetime(2024, 1, 1, 0, 0, 0)
-        date2 = datetime(2024, 1, 15, 0, 0, 0)
-        date3 = datetime(2024, 2, 1, 0, 0, 0)
-        
-        file1 = self._create_test_file(content=b'content1', filename='file1.txt')
-        response1 = self.client.post('/api/files/', {'file': file1}, format='multipart')
-        file1_obj = File.objects.get(id=response1.json()['id'])
-        # update() bypasses auto_now_add
-        File.objects.filter(id=file1_obj.id).update(uploaded_at=timezone.make_aware(date1))
-        
-        file2 = self._create_test_file(content=b'content2', filename='file2.txt')
-        response2 = self.client.post('/api/files/', {'file': file2}, format='multipart')
-        file2_obj = File.objects.get(id=response2.json()['id'])
-        File.objects.filter(id=file2_obj.id).update(uploaded_at=timezone.make_aware(date2))
-        
-        file3 = self._create_test_file(content=b'content3', filename='file3.txt')
-        response3 = self.client.post('/api/files/', {'file': file3}, format='multipart')
-        file3_obj = File.objects.get(id=response3.json()['id'])
-        File.objects.filter(id=file3_obj.id).update(uploaded_at=timezone.make_aware(date3))
+        # A date-only bound covers the whole day: the view filters uploaded_at < the start of the next day
+        self._seed_files([
+            {'original_filename': 'file1.txt', 'uploaded_at': datetime(2024, 1, 1, 0, 0, 0)},
+            {'original_filename': 'file2.txt', 'uploaded_at': datetime(2024, 1, 15, 0, 0, 0)},
+            {'original_filename': 'file3.txt', 'uploaded_at': datetime(2024, 2, 1, 0, 0, 0)},
+        ])
         
         response = self.client.get('/api/files/', {'uploaded_before': '2024-01-15'})
         
@@ -394,33 +675,12 @@ class FileSearchAndFilteringTests(TestCase):
         date1 = datetime(2024, 1, 20, 12, 0, 0)
         date2 = datetime(2024, 1, 10, 12, 0, 0)
         
-        file1 = self._create_test_file(content=b'x' * 500, filename='test.pdf', content_type='application/pdf')
-        response1 = self.client.post('/api/files/', {'file': file1}, format='multipart')
-        file1_obj = File.objects.get(id=response1.json()['id'])
-        file1_obj.size = 500
-        file1_obj.uploaded_at = timezone.make_aware(date1)
-        file1_obj.save()
-        
-        file2 = self._create_test_file(content=b'x' * 500, filename='test.txt', content_type='text/plain')
-        response2 = self.client.post('/api/files/', {'file': file2}, format='multipart')
-        file2_obj = File.objects.get(id=response2.json()['id'])
-        file2_obj.size = 500
-        file2_obj.uploaded_at = timezone.make_aware(date1)
-        file2_obj.save()
-        
-        file3 = self._create_test_file(content=b'x' * 100, filename='other.pdf', content_type='application/pdf')
-        response3 = self.client.post('/api/files/', {'file': file3}, format='multipart')
-        file3_obj = File.objects.get(id=response3.json()['id'])
-        file3_obj.size = 100
-        file3_obj.uploaded_at = timezone.make_aware(date1)
-        file3_obj.save()
-        
-        file4 = self._create_test_file(content=b'y' * 500, filename='test.pdf', content_type='application/pdf')
-        response4 = self.client.post('/api/files/', {'file': file4}, format='multipart')
-        file4_obj = File.objects.get(id=response4.json()['id'])
-        file4_obj.size = 500
-        file4_obj.uploaded_at = timezone.make_aware(date2)
-        file4_obj.save()
+        self._seed_files([
+            {'original_filename': 'test.pdf', 'file_type': 'application/pdf', 'size': 500, 'uploaded_at': date1},
+            {'original_filename': 'test.txt', 'file_type': 'text/plain', 'size': 500, 'uploaded_at': date1},
+            {'original_filename': 'other.pdf', 'file_type': 'application/pdf', 'size': 100, 'uploaded_at': date1},
+            {'original_filename': 'test.pdf', 'file_type': 'application/pdf', 'size': 500, 'uploaded_at': date2},
+        ])
         
         response = self.client.get('/api/files/', {
             'search': 'test',
@@ -474,3 +734,119 @@ class FileSearchAndFilteringTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         data = response.json()
         self.assertEqual(data, [], "Should return empty array when no files match")
+    
+    def test_search_013_list_file_url_matches_detail(self):
+        test_file = self._create_test_file(content=b'url content', filename='my report.txt')
+        file_id = self.client.post('/api/files/', {'file': test_file}, format='multipart').json()['id']
+        
+        list_item = self.client.get('/api/files/').json()[0]
+        detail = self.client.get(f'/api/files/{file_id}/').json()
+        
+        self.assertEqual(list_item['file'], detail['file'])
+        self.assertTrue(list_item['file'].startswith('http://testserver/media/uploads/'))
+        self.assertNotIn('fingerprint', list_item)
+    
+    def test_search_014_listing_duplicates_does_not_query_per_row(self):
+        for i in range(3):
+            test_file = self._create_test_file(content=b'shared content', filename=f'copy_{i}.txt')
+            self.client.post('/api/files/', {'file': test_file}, format='multipart')
+        
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/files/')
+        
+        data = response.json()
+        self.assertEqual(len(data), 3)
+        original_id = next(item['id'] for item in data if not item['is_duplicate'])
+        for item in data:
+            if item['is_duplicate']:
+                self.assertEqual(item['referenced_file_id'], original_id)
+    
+    def test_search_015_export_streams_filtered_json_array(self):
+        file1 = self._create_test_file(content=b'content1', filename='a.pdf', content_type='application/pdf')
+        self.client.post('/api/files/', {'file': file1}, format='multipart')
+        file2 = self._create_test_file(content=b'content2', filename='b.txt', content_type='text/plain')
+        self.client.post('/api/files/', {'file': file2}, format='multipart')
+        
+        response = self.client.get('/api/files/export/', {'file_type': 'application/pdf'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([item['original_filename'] for item in data], ['a.pdf'])
+        self.assertEqual(data, self.client.get('/api/files/', {'file_type': 'application/pdf'}).json())
+    
+    def test_search_016_stats_counts_files_per_type(self):
+        file1 = self._create_test_file(content=b'content1', filename='a.pdf', content_type='application/pdf')
+        self.client.post('/api/files/', {'file': file1}, format='multipart')
+        file2 = self._create_test_file(content=b'content1', filename='b.pdf', content_type='application/pdf')
+        self.client.post('/api/files/', {'file': file2}, format='multipart')
+        file3 = self._create_test_file(content=b'content3', filename='c.txt', content_type='text/plain')
+        txt_id = self.client.post('/api/files/', {'file': file3}, format='multipart').json()['id']
+        
+        self.client.delete(f'/api/files/{txt_id}/')
+        
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/files/stats/')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {
+            'total': 2,
+            'file_types': [{'file_type': 'application/pdf', 'count': 2}],
+        })
+        self.assertEqual(FileTypeStat.objects.get(file_type='text/plain').count, 0)
+    
+    def test_search_021_stats_follow_file_type_changes(self):
+        file1 = self._create_test_file(content=b'content1', filename='a.pdf', content_type='application/pdf')
+        file_id = self.client.post('/api/files/', {'file': file1}, format='multipart').json()['id']
+        
+        response = self.client.patch(f'/api/files/{file_id}/', {'file_type': 'text/plain'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.patch(f'/api/files/{file_id}/', {'original_filename': 'renamed.txt'}, format='json')
+        
+        self.assertEqual(self.client.get('/api/files/stats/').json(), {
+            'total': 1,
+            'file_types': [{'file_type': 'text/plain', 'count': 1}],
+        })
+        self.assertEqual(FileTypeStat.objects.get(file_type='application/pdf').count, 0)
+    
+    def test_search_017_limit_paginates_list(self):
+        self._seed_files([
+            {'original_filename': 'file1.txt', 'uploaded_at': datetime(2024, 1, 1, 12, 0, 0)},
+            {'original_filename': 'file2.txt', 'uploaded_at': datetime(2024, 1, 2, 12, 0, 0)},
+            {'original_filename': 'file3.txt', 'uploaded_at': datetime(2024, 1, 3, 12, 0, 0)},
+        ])
+        
+        response = self.client.get('/api/files/', {'limit': '2', 'offset': '1'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['count'], 3)
+        self.assertEqual([item['original_filename'] for item in data['results']], ['file2.txt', 'file1.txt'])
+        self.assertIsInstance(self.client.get('/api/files/').json(), list)
+    
+    def test_search_018_date_bounds_follow_active_timezone(self):
+        with timezone.override('UTC'):
+            utc_bound, _ = parse_iso_datetime('2024-01-15')
+        with timezone.override('America/New_York'):
+            new_york_bound, _ = parse_iso_datetime('2024-01-15')
+        
+        self.assertEqual(new_york_bound - utc_bound, timedelta(hours=5))
+    
+    def test_search_019_fuzzy_search_falls_back_to_substring_outside_postgres(self):
+        self._seed_files([
+            {'original_filename': 'Quarterly_Report.pdf'},
+            {'original_filename': 'notes.txt'},
+        ])
+        
+        response = self.client.get('/api/files/', {'search': 'report', 'fuzzy': 'true'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['original_filename'] for item in response.json()], ['Quarterly_Report.pdf'])
+    
+    def test_search_020_uploaded_before_last_representable_date(self):
+        self._seed_files([{'original_filename': 'file1.txt'}])
+        
+        response = self.client.get('/api/files/', {'uploaded_before': '9999-12-31'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()), 1)
@@ -0,0 +1,40 @@
+import blake3
+import xxhash
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class HashingUploadMixin:
+    """
+    Compute the dedup digests while the request body streams in.
+
+    The finished upload carries `fingerprint` and `content_hash` attributes,
+    so ingest_upload() never has to read the bytes a second time to hash them.
+    """
+
+    def new_file(self, *args, **kwargs):
+        # Set before super(): MemoryFileUploadHandler.new_file raises StopFutureHandlers when it takes the file
+        self.fingerprint_hasher = xxhash.xxh3_128()
+        self.content_hasher = blake3.blake3()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        # The memory handler only owns the file when activated; otherwise the chunk belongs to the next handler
+        if getattr(self, 'activated', True):
+            self.fingerprint_hasher.update(raw_data)
+            self.content_hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.fingerprint = self.fingerprint_hasher.hexdigest()
+            file.content_hash = self.content_hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
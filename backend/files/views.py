@@ -1,208 +1,650 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import render
-from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.db import connection, transaction
 from django.db import IntegrityError
-from django.db.models import F
-from django.utils.dateparse import parse_date, parse_datetime
+from django.db.models import Count, Q
+from django.db.models.functions import Upper
 from django.utils import timezone
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
+from rest_framework.decorators import action
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.exceptions import ValidationError
-from rest_framework.exceptions import PermissionDenied
-import hashlib
-from datetime import datetime
-from .models import File
-from .serializers import FileSerializer
+from rest_framework.exceptions import NotFound, PermissionDenied
+import blake3
+import json
+import mmap
+import os
+import threading
+import xxhash
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from datetime import datetime, timedelta
+from .models import File, FileTypeStat, UploadSession
+from .serializers import FileSerializer, FileListSerializer, UploadSessionSerializer
+from .tasks import delete_stored_file, finalize_upload
 
 
-def compute_file_hash(file_obj, chunk_size=8192):
+# Read size for hashing; large reads amortize per-call Python and syscall overhead
+HASH_CHUNK_SIZE = 1 << 20
+
+# Columns dedup reads from a matched original; loading the rest of the row is wasted work
+DEDUP_FIELDS = ('id', 'file', 'size', 'content_hash', 'fingerprint')
+
+# Minimum pg_trgm similarity for ?fuzzy=true filename search (PostgreSQL only)
+FUZZY_SEARCH_THRESHOLD = 0.2
+
+# Inputs at least this large are hashed on all cores; below it thread startup costs more than it saves
+BLAKE3_THREADED_MIN_SIZE = 1 << 24
+
+# Rows fetched per round trip when streaming the export endpoint
+EXPORT_CHUNK_SIZE = 2000
+
+
+# Hashes of independent stored files run side by side; BLAKE3 and xxh3 release the GIL.
+# Threads are only started on first use, so forking workers after import is safe.
+_HASH_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='file-hash')
+
+_thread_state = threading.local()
+
+
+def _read_buffer(size):
+    # One read buffer per worker thread, reused across uploads instead of allocated per hash
+    buf = getattr(_thread_state, 'buf', None)
+    if buf is None or len(buf) != size:
+        buf = _thread_state.buf = bytearray(size)
+    return buf
+
+
+def _map_file(raw_file):
+    # Read-only mapping of a real OS file, or None for in-memory/unknown objects and empty files
+    try:
+        fd = raw_file.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+    try:
+        mapped = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # Empty files, pipes and special files can't be mapped
+        return None
+    if hasattr(mapped, 'madvise'):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)
+    return mapped
+
+
+def _digest_file(hasher, file_obj, chunk_size):
     # Preserves file pointer position after hashing (required for subsequent file operations)
-    sha256 = hashlib.sha256()
     original_position = file_obj.tell()
     
     file_obj.seek(0)
     try:
-        while True:
-            chunk = file_obj.read(chunk_size)
-            if not chunk:
-                break
-            sha256.update(chunk)
+        # Unwrap Django File proxies so BytesIO.getbuffer() is visible
+        raw_file = getattr(file_obj, 'file', file_obj)
+        readinto = getattr(file_obj, 'readinto', None)
+        # BLAKE3 and xxh3 release the GIL inside large update() calls, so other request threads keep running
+        if hasattr(raw_file, 'getbuffer'):
+            # In-memory upload: one update over the whole buffer, no copies
+            with raw_file.getbuffer() as view:
+                hasher.update(view)
+        elif (mapped := _map_file(raw_file)) is not None:
+            # On-disk file (spilled upload or stored original): hash straight from the page cache
+            with mapped, memoryview(mapped) as view:
+                hasher.update(view)
+        elif readinto is None:
+            while True:
+                chunk = file_obj.read(chunk_size)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+        else:
+            buf = _read_buffer(chunk_size)
+            view = memoryview(buf)
+            while True:
+                n = readinto(buf)
+                if not n:
+                    break
+                hasher.update(view[:n])
     finally:
         file_obj.seek(original_position)
     
-    return sha256.hexdigest()
+    return hasher.hexdigest()
+
+
+def _file_size(file_obj):
+    # Stored files opened from storage carry no .size; fall back to the descriptor
+    size = getattr(file_obj, 'size', None)
+    if size is not None:
+        return size
+    try:
+        return os.fstat(file_obj.fileno()).st_size
+    except (AttributeError, OSError, ValueError):
+        return 0
+
+
+def compute_file_hash(file_obj, chunk_size=HASH_CHUNK_SIZE):
+    # BLAKE3 with the default 32-byte digest keeps hashes at 64 hex chars, same as SHA-256
+    if _file_size(file_obj) >= BLAKE3_THREADED_MIN_SIZE:
+        hasher = blake3.blake3(max_threads=blake3.blake3.AUTO)
+    else:
+        hasher = blake3.blake3()
+    return _digest_file(hasher, file_obj, chunk_size)
+
+
+def compute_file_fingerprint(file_obj, chunk_size=HASH_CHUNK_SIZE):
+    # Non-cryptographic xxh3-128 digest used to find dedup candidates cheaply
+    return _digest_file(xxhash.xxh3_128(), file_obj, chunk_size)
+
+
+@contextmanager
+def open_stored_for_hashing(field_file):
+    """
+    Open a stored file for one sequential pass.
+    
+    On local storage with posix_fadvise, the kernel is told to read ahead
+    aggressively and the pages are dropped afterwards so rescans don't
+    evict the rest of the page cache. Other storages fall back to open().
+    """
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        path = None
+    
+    if path is None or not hasattr(os, 'posix_fadvise'):
+        with field_file.storage.open(field_file.name, 'rb') as stored_file:
+            yield stored_file
+        return
+    
+    fd = os.open(path, os.O_RDONLY)
+    # Advice values are not flags and can't be OR-ed together; NOREUSE is a no-op on most kernels
+    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    with os.fdopen(fd, 'rb') as stored_file:
+        try:
+            yield stored_file
+        finally:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def upload_digest(file_obj, attr, compute):
+    # The upload handlers in upload.py attach digests computed while the request streamed in
+    return getattr(file_obj, attr, None) or compute(file_obj)
+
+
+def upload_name(file_obj):
+    return File._meta.get_field('file').generate_filename(None, file_obj.name)
+
+
+def ingest_upload(file_obj):
+    """
+    Store an upload as a new original or as a duplicate of an existing one.
+    
+    Returns the created File row. Shared by the upload view and the background
+    finalize_upload task.
+    """
+    storage = File._meta.get_field('file').storage
+    new_file = {
+        'original_filename': file_obj.name,
+        'file_type': file_obj.content_type,
+    }
+    
+    cached = _cached_candidate(file_obj)
+    if cached is not None:
+        with transaction.atomic():
+            # The row lock keeps destroy() from removing the original before the duplicate commits
+            if File.objects.select_for_update().filter(id=cached.id).exists():
+                return _resolve_candidate(file_obj, cached, new_file, storage)
+        # The cached original was deleted behind the cache's back; fall through to the database lookup
+        cache.delete(candidate_cache_key(file_obj.size, cached.fingerprint))
+    
+    if not File.objects.filter(size=file_obj.size, is_duplicate=False).exists():
+        # No original has this size, so this upload cannot be a duplicate: nothing is compared.
+        # Digests from the upload handler are stored as they are; uploads without them (the
+        # background task) skip hashing and are fingerprinted lazily when a same-size upload arrives.
+        stored_name = storage.save(upload_name(file_obj), file_obj)
+        with transaction.atomic():
+            return _insert_original(
+                file_obj, new_file, storage, stored_name,
+                getattr(file_obj, 'fingerprint', None), getattr(file_obj, 'content_hash', None),
+            )
+    
+    _fingerprint_unhashed_originals(file_obj.size)
+    fingerprint = upload_digest(file_obj, 'fingerprint', compute_file_fingerprint)
+    
+    with transaction.atomic():
+        # Locked like the cached path: a matched original must outlive the duplicate insert
+        candidate = File.objects.select_for_update().filter(
+            fingerprint=fingerprint, size=file_obj.size, is_duplicate=False
+        ).only(*DEDUP_FIELDS).first()
+        if candidate:
+            if candidate.content_hash is not None:
+                _remember_candidate(candidate)
+            # Decided before anything is written: duplicates never touch storage
+            return _resolve_candidate(file_obj, candidate, new_file, storage)
+        
+        stored_name = storage.save(upload_name(file_obj), file_obj)
+        # The lookup above already missed, so insert directly instead of get_or_create()'s second SELECT
+        return _insert_original(
+            file_obj, new_file, storage, stored_name, fingerprint, getattr(file_obj, 'content_hash', None)
+        )
+
+
+def _insert_original(file_obj, new_file, storage, stored_name, fingerprint, content_hash):
+    # The partial unique constraints on originals arbitrate concurrent uploads of the same bytes
+    try:
+        with transaction.atomic():
+            original = File.objects.create(
+                fingerprint=fingerprint,
+                content_hash=content_hash,
+                size=file_obj.size,
+                is_duplicate=False,
+                file=stored_name,
+                **new_file
+            )
+    except IntegrityError:
+        # Lost the race to a concurrent upload with the same bytes
+        same_bytes = Q(fingerprint=fingerprint)
+        if content_hash is not None:
+            same_bytes |= Q(content_hash=content_hash)
+        candidate = File.objects.select_for_update().filter(
+            same_bytes, size=file_obj.size, is_duplicate=False
+        ).only(*DEDUP_FIELDS).first()
+        if candidate is None:
+            raise
+        return _resolve_candidate(file_obj, candidate, new_file, storage, stored_name)
+    
+    if content_hash is not None:
+        _remember_candidate(original)
+    return original
+
+
+def _resolve_candidate(file_obj, candidate, new_file, storage, stored_name=None):
+    existing_file, content_hash = _confirm_match(file_obj, candidate)
+    if existing_file:
+        if stored_name:
+            storage.delete(stored_name)
+        return _create_duplicate(file_obj, existing_file, content_hash)
+    
+    # Fingerprint collision with different content: keep the row out of the fingerprint index
+    original = File.objects.create(
+        file=stored_name or storage.save(upload_name(file_obj), file_obj),
+        size=file_obj.size,
+        content_hash=content_hash,
+        fingerprint=None,
+        is_duplicate=False,
+        **new_file
+    )
+    return original
+
+
+def candidate_cache_key(size, fingerprint):
+    return f'file-dedup:{size}:{fingerprint}'
+
+
+def _cached_candidate(file_obj):
+    # Only uploads fingerprinted by the upload handler can be looked up for free
+    fingerprint = getattr(file_obj, 'fingerprint', None)
+    if fingerprint is None:
+        return None
+    values = cache.get(candidate_cache_key(file_obj.size, fingerprint))
+    if values is None:
+        return None
+    return File(size=file_obj.size, is_duplicate=False, **values)
+
+
+def _remember_candidate(candidate):
+    # Only originals with a content_hash are cached: their dedup columns never change again
+    cache.set(
+        candidate_cache_key(candidate.size, candidate.fingerprint),
+        {
+            'id': candidate.id,
+            'file': candidate.file.name,
+            'content_hash': candidate.content_hash,
+            'fingerprint': candidate.fingerprint,
+        },
+        timeout=None,
+    )
+
+
+def _stored_digest(compute, field_file):
+    with open_stored_for_hashing(field_file) as stored_file:
+        return compute(stored_file)
+
+
+def _stored_fingerprint(original):
+    # A row whose stored bytes are gone can't be matched; skip it like migration 0003 does
+    # rather than failing every later upload of the same size
+    try:
+        return _stored_digest(compute_file_fingerprint, original.file)
+    except OSError:
+        return None
+
+
+def _fingerprint_unhashed_originals(size):
+    # Originals stored via the size short-circuit carry neither hash yet
+    unhashed = list(File.objects.filter(
+        size=size, is_duplicate=False, fingerprint__isnull=True, content_hash__isnull=True
+    ).only('id', 'file'))
+    # Hash in parallel; the database writes stay on this thread and its connection
+    fingerprints = _HASH_POOL.map(_stored_fingerprint, unhashed)
+    for original, fingerprint in zip(unhashed, fingerprints):
+        if fingerprint is None:
+            continue
+        try:
+            with transaction.atomic():
+                File.objects.filter(id=original.id).update(fingerprint=fingerprint)
+        except IntegrityError:
+            # Two first-of-their-size uploads raced past the size check; another original owns the fingerprint
+            _merge_into_fingerprint_owner(original, size, fingerprint)
+
+
+def _merge_into_fingerprint_owner(original, size, fingerprint):
+    # Turns a second stored copy of the same bytes into a duplicate of the owner so it is
+    # neither kept on disk nor rescanned by every later same-size upload
+    storage = File._meta.get_field('file').storage
+    content_hash = _stored_digest(compute_file_hash, original.file)
+    
+    with transaction.atomic():
+        owner = File.objects.select_for_update().filter(
+            size=size, fingerprint=fingerprint, is_duplicate=False
+        ).only(*DEDUP_FIELDS).first()
+        if owner is not None and owner.content_hash is None:
+            owner.content_hash = _stored_digest(compute_file_hash, owner.file)
+            File.objects.filter(id=owner.id).update(content_hash=owner.content_hash)
+        
+        if owner is None or owner.content_hash != content_hash:
+            # A genuine fingerprint collision: stays an original outside the fingerprint index,
+            # hashed so it no longer counts as unhashed
+            File.objects.filter(id=original.id).update(content_hash=content_hash)
+            return
+        
+        File.objects.filter(id=original.id).update(
+            is_duplicate=True,
+            referenced_file=owner,
+            fingerprint=fingerprint,
+            content_hash=content_hash,
+            file=owner.file.name,
+        )
+        stored_name = original.file.name
+        transaction.on_commit(lambda: storage.delete(stored_name))
+
+
+def _confirm_match(file_obj, candidate):
+    """
+    Return (original, content_hash) for an upload whose fingerprint matched candidate.
+    
+    The cryptographic hash is only computed here, once an original with the
+    same size and fingerprint exists.
+    """
+    if candidate.content_hash is None:
+        # Originals are stored without content_hash until their first fingerprint match;
+        # hash the stored copy in the pool while this thread hashes the upload
+        stored_hash = _HASH_POOL.submit(_stored_digest, compute_file_hash, candidate.file)
+    
+    content_hash = upload_digest(file_obj, 'content_hash', compute_file_hash)
+    
+    if candidate.content_hash is None:
+        candidate.content_hash = stored_hash.result()
+        File.objects.filter(id=candidate.id).update(content_hash=candidate.content_hash)
+        _remember_candidate(candidate)
+    
+    if candidate.content_hash != content_hash:
+        # Fingerprint collision: the matching original (if any) was stored without a fingerprint
+        existing_file = File.objects.select_for_update().filter(
+            content_hash=content_hash, is_duplicate=False
+        ).only(*DEDUP_FIELDS).first()
+        return existing_file, content_hash
+    return candidate, content_hash
+
+
+def _create_duplicate(file_obj, existing_file, content_hash):
+    # A single insert: the original's reference_count is derived from its duplicates,
+    # so its row is never written here.
+    # Reuse original file on disk (use string path, not FieldFile, to avoid duplicate write)
+    # Hashes are kept on duplicates too; uniqueness only applies to originals
+    duplicate_file = File.objects.create(
+        original_filename=file_obj.name,
+        file_type=file_obj.content_type,
+        size=file_obj.size,
+        content_hash=content_hash,
+        fingerprint=existing_file.fingerprint,
+        is_duplicate=True,
+        referenced_file=existing_file,
+        file=existing_file.file.name,
+    )
+    
+    return duplicate_file
+
+
+# (query param, lookup)
+_INT_FILTERS = (
+    ('size_min', 'size__gte'),
+    ('size_max', 'size__lte'),
+)
+
+# (query param, datetime lookup, bare-date lookup, days added to a bare date)
+# A bare uploaded_after date means start of that day; a bare uploaded_before date includes
+# the whole day as < start of next day, an index-friendly half-open range
+_DATE_FILTERS = (
+    ('uploaded_after', 'uploaded_at__gte', 'uploaded_at__gte', 0),
+    ('uploaded_before', 'uploaded_at__lte', 'uploaded_at__lt', 1),
+)
+
+
+def parse_iso_datetime(value):
+    """
+    Parse an ISO 8601 date or datetime query value into an aware datetime.
+    
+    Uses the C-implemented datetime.fromisoformat rather than Django's regex
+    parsers. Returns (datetime, date_only); bare dates map to midnight.
+    Raises ValueError on malformed input.
+    """
+    # Naive values are made aware in the active timezone, which can change per request
+    return _parse_iso_datetime(value, timezone.get_current_timezone_name())
+
+
+@lru_cache(maxsize=1024)
+def _parse_iso_datetime(value, timezone_name):
+    # Dashboards re-send the same bounds on every poll; results are immutable, so share them
+    datetime_obj = datetime.fromisoformat(value)
+    if timezone.is_naive(datetime_obj):
+        datetime_obj = timezone.make_aware(datetime_obj)
+    # YYYY-MM-DD / YYYYMMDD carry no time component
+    return datetime_obj, len(value) <= 10
+
+
+class FilePagination(LimitOffsetPagination):
+    # Opt-in: without ?limit= the list stays a plain array, as existing clients expect
+    default_limit = None
+    max_limit = 500
 
 
 class FileViewSet(viewsets.ModelViewSet):
     queryset = File.objects.all()
     serializer_class = FileSerializer
+    pagination_class = FilePagination
+
+    # Columns the list endpoint serializes; skips the internal fingerprint
+    LIST_FIELDS = (
+        'id', 'original_filename', 'file_type', 'size', 'uploaded_at', 'content_hash',
+        'is_duplicate', 'referenced_file_id', 'file',
+    )
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'export'):
+            return FileListSerializer
+        return FileSerializer
 
     def get_queryset(self):
-        queryset = File.objects.all()
+        # reference_count is 1 + duplicate_count for originals; one aggregate instead of a COUNT per row
+        # Meta.ordering is ignored on aggregate queries, so restate it
+        queryset = File.objects.annotate(duplicate_count=Count('duplicates')).order_by(*File._meta.ordering)
+        if self.action in ('list', 'export'):
+            queryset = queryset.only(*self.LIST_FIELDS)
         query_params = self.request.query_params
         
         search = query_params.get('search')
-        if search:
+        if search and query_params.get('fuzzy') == 'true' and connection.vendor == 'postgresql':
+            # Imported here: older Django releases need psycopg to import contrib.postgres
+            from django.contrib.postgres.lookups import TrigramSimilar
+            from django.contrib.postgres.search import TrigramSimilarity
+            # The % operator reads its cutoff from this setting; it applies to the connection's session
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT set_config('pg_trgm.similarity_threshold', %s, false)", [str(FUZZY_SEARCH_THRESHOLD)]
+                )
+            # Typo-tolerant, best match first. Filtering with % on UPPER(original_filename) lets the GIN
+            # index from migration 0004 find the matches; similarity() is only computed to rank them
+            filename = Upper('original_filename')
+            queryset = queryset.filter(TrigramSimilar(filename, search.upper())).annotate(
+                similarity=TrigramSimilarity(filename, search.upper())
+            ).order_by('-similarity', '-uploaded_at')
+        elif search:
             queryset = queryset.filter(original_filename__icontains=search)
         
         file_type = query_params.get('file_type')
         if file_type:
             queryset = queryset.filter(file_type=file_type)
         
-        size_min = query_params.get('size_min')
-        if size_min:
-            try:
-                size_min_int = int(size_min)
-                queryset = queryset.filter(size__gte=size_min_int)
-            except ValueError:
-                raise ValidationError({'size_min': 'Must be a valid integer'})
-        
-        size_max = query_params.get('size_max')
-        if size_max:
-            try:
-                size_max_int = int(size_max)
-                queryset = queryset.filter(size__lte=size_max_int)
-            except ValueError:
-                raise ValidationError({'size_max': 'Must be a valid integer'})
+        for param, lookup in _INT_FILTERS:
+            value = query_params.get(param)
+            if value:
+                try:
+                    queryset = queryset.filter(**{lookup: int(value)})
+                except ValueError:
+                    raise ValidationError({param: 'Must be a valid integer'})
         
-        uploaded_after = query_params.get('uploaded_after')
-        if uploaded_after:
-            try:
-                # Try datetime first, fallback to date (start of day for >= comparison)
-                datetime_obj = parse_datetime(uploaded_after)
-                if datetime_obj is None:
-                    date_obj = parse_date(uploaded_after)
-                    if date_obj is None:
-                        raise ValueError("Invalid date format")
-                    datetime_obj = timezone.make_aware(datetime.combine(date_obj, datetime.min.time()))
-                elif timezone.is_naive(datetime_obj):
-                    datetime_obj = timezone.make_aware(datetime_obj)
-                queryset = queryset.filter(uploaded_at__gte=datetime_obj)
-            except (ValueError, TypeError, AttributeError):
-                raise ValidationError({'uploaded_after': 'Must be a valid ISO 8601 date (YYYY-MM-DD)'})
-        
-        uploaded_before = query_params.get('uploaded_before')
-        if uploaded_before:
-            try:
-                # Try datetime first, fallback to date (end of day for <= comparison)
-                datetime_obj = parse_datetime(uploaded_before)
-                if datetime_obj is None:
-                    date_obj = parse_date(uploaded_before)
-                    if date_obj is None:
-                        raise ValueError("Invalid date format")
-                    datetime_obj = timezone.make_aware(datetime.combine(date_obj, datetime.max.time()))
-                elif timezone.is_naive(datetime_obj):
-                    datetime_obj = timezone.make_aware(datetime_obj)
-                queryset = queryset.filter(uploaded_at__lte=datetime_obj)
-            except (ValueError, TypeError, AttributeError):
-                raise ValidationError({'uploaded_before': 'Must be a valid ISO 8601 date (YYYY-MM-DD)'})
+        for param, lookup, date_only_lookup, date_only_days in _DATE_FILTERS:
+            value = query_params.get(param)
+            if value:
+                try:
+                    datetime_obj, date_only = parse_iso_datetime(value)
+                except ValueError:
+                    raise ValidationError({param: 'Must be a valid ISO 8601 date (YYYY-MM-DD)'})
+                if date_only:
+                    try:
+                        bound = datetime_obj + timedelta(days=date_only_days)
+                    except OverflowError:
+                        # The whole of 9999-12-31 is requested: no representable upper bound excludes anything
+                        continue
+                    queryset = queryset.filter(**{date_only_lookup: bound})
+                else:
+                    queryset = queryset.filter(**{lookup: datetime_obj})
         
         return queryset
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        # Same filters as list, streamed as a JSON array so memory stays flat for any result size
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer()
+        return StreamingHttpResponse(
+            self._stream_json_array(queryset, serializer),
+            content_type='application/json',
+        )
+
+    def _stream_json_array(self, queryset, serializer):
+        yield '['
+        for index, file_obj in enumerate(queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)):
+            item = json.dumps(serializer.to_representation(file_obj), cls=JSONEncoder)
+            yield item if index == 0 else ',' + item
+        yield ']'
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        # Per-type counts for the type filter, read from the denormalized FileTypeStat table
+        file_types = list(FileTypeStat.objects.filter(count__gt=0).values('file_type', 'count'))
+        return Response({
+            'total': sum(row['count'] for row in file_types),
+            'file_types': file_types,
+        })
+
     def create(self, request, *args, **kwargs):
         file_obj = request.FILES.get('file')
         if not file_obj:
             return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
         
-        content_hash = compute_file_hash(file_obj)
+        data = {
+            'file': file_obj,
+            'original_filename': file_obj.name,
+            'file_type': file_obj.content_type,
+            'size': file_obj.size,
+        }
         
-        with transaction.atomic():
-            existing_file = File.objects.filter(content_hash=content_hash).first()
-            
-            if existing_file:
-                # Reuse original file on disk (use string path, not FieldFile, to avoid duplicate write)
-                # content_hash=None: unique constraint only applies to originals
-                duplicate_file = File.objects.create(
-                    original_filename=file_obj.name,
-                    file_type=file_obj.content_type,
-                    size=file_obj.size,
-                    content_hash=None,
-                    is_duplicate=True,
-                    referenced_file=existing_file,
-                    reference_count=1,
-                    file=existing_file.file.name,
-                )
-                
-                # Atomic increment to prevent race conditions
-                File.objects.filter(id=existing_file.id).update(
-                    reference_count=F('reference_count') + 1
-                )
-                
-                existing_file.refresh_from_db()
-                
-                serializer = self.get_serializer(duplicate_file)
-                headers = self.get_success_headers(serializer.data)
-                return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
-            
-            try:
-                data = {
-                    'file': file_obj,
-                    'original_filename': file_obj.name,
-                    'file_type': file_obj.content_type,
-                    'size': file_obj.size,
-                }
-                
-                serializer = self.get_serializer(data=data)
-                serializer.is_valid(raise_exception=True)
-                # Pass via save() to bypass read_only_fields restriction
-                serializer.save(
-                    content_hash=content_hash,
-                    is_duplicate=False,
-                    reference_count=1
-                )
-                
-                headers = self.get_success_headers(serializer.data)
-                return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
-                
-            except IntegrityError:
-                # Race condition: concurrent upload created file with same hash between check and save
-                existing_file = File.objects.get(content_hash=content_hash)
-                
-                duplicate_file = File.objects.create(
-                    original_filename=file_obj.name,
-                    file_type=file_obj.content_type,
-                    size=file_obj.size,
-                    content_hash=None,
-                    is_duplicate=True,
-                    referenced_file=existing_file,
-                    reference_count=1,
-                    file=existing_file.file.name,
-                )
-                
-                File.objects.filter(id=existing_file.id).update(
-                    reference_count=F('reference_count') + 1
-                )
-                
-                existing_file.refresh_from_db()
-                
-                serializer = self.get_serializer(duplicate_file)
-                headers = self.get_success_headers(serializer.data)
-                return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+        serializer = self.get_serializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        
+        if settings.FILE_UPLOAD_ASYNC:
+            return self._stage_upload(file_obj)
+        
+        instance = ingest_upload(file_obj)
+        if not instance.is_duplicate:
+            # A new original: nothing references it yet, so reference_count needs no COUNT query
+            instance.duplicate_count = 0
+        return self._created_response(instance)
+
+    def _stage_upload(self, file_obj):
+        # Only write the bytes here; dedup runs in the finalize_upload task, which reuses the
+        # digests the upload handlers already computed instead of hashing the staged copy again
+        session = UploadSession.objects.create(
+            staged_file=file_obj,
+            original_filename=file_obj.name,
+            file_type=file_obj.content_type,
+            size=file_obj.size,
+            content_hash=getattr(file_obj, 'content_hash', None),
+            fingerprint=getattr(file_obj, 'fingerprint', None),
+        )
+        # Enqueue after commit so the worker never sees a missing session row
+        transaction.on_commit(lambda: finalize_upload.delay(str(session.id)))
+        
+        serializer = UploadSessionSerializer(session, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    def _created_response(self, instance):
+        serializer = self.get_serializer(instance)
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         
         with transaction.atomic():
             if instance.is_duplicate:
-                # Deleting a duplicate: decrement reference_count on original
-                original = instance.referenced_file
-                if original:
-                    File.objects.filter(id=original.id).update(
-                        reference_count=F('reference_count') - 1
-                    )
+                # Deleting a duplicate: the original's reference_count drops with the row itself
                 # Delete the duplicate record (no physical file to delete)
                 instance.delete()
                 return Response(status=status.HTTP_204_NO_CONTENT)
             else:
-                # Deleting an original: only allow if no duplicates exist
-                if instance.reference_count > 1:
+                # Deleting an original: only allow if no duplicates exist. Locking the row first
+                # serializes this check against ingest_upload() adding a duplicate of it.
+                if not File.objects.select_for_update().filter(id=instance.id).exists():
+                    raise NotFound()
+                if instance.duplicates.exists():
                     raise PermissionDenied(
                         detail='Cannot delete original file that has duplicates. Delete duplicates first.'
                     )
                 
-                # Delete physical file if it exists
+                if instance.fingerprint:
+                    cache_key = candidate_cache_key(instance.size, instance.fingerprint)
+                    transaction.on_commit(lambda: cache.delete(cache_key))
+                
+                # Delete physical file if it exists, only once the row delete has committed
                 if instance.file:
-                    instance.file.delete()
+                    stored_name = instance.file.name
+                    if settings.FILE_DELETE_ASYNC:
+                        transaction.on_commit(lambda: delete_stored_file.delay(stored_name))
+                    else:
+                        transaction.on_commit(lambda: delete_stored_file(stored_name))
                 
                 # Delete the record
                 instance.delete()
                 return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadSessionViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    # Polling endpoint for uploads accepted with FILE_UPLOAD_ASYNC
+    queryset = UploadSession.objects.select_related('file')
+    serializer_class = UploadSessionSerializer
+
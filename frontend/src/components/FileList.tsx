@@ -17,16 +17,16 @@ export const FileList: React.FC = () => {
   // Separate pending (editing) and applied (query) filter state to prevent query on every keystroke
   const [appliedFilters, setAppliedFilters] = useState<FileFilters>({});
 
-  const { data: allFiles } = useQuery({
-    queryKey: ['files', 'all'],
-    queryFn: () => fileService.getFiles(),
+  // Type options come from the server-side per-type counts rather than fetching every file
+  const { data: stats } = useQuery({
+    queryKey: ['files', 'stats'],
+    queryFn: () => fileService.getStats(),
   });
 
   const uniqueFileTypes = useMemo(() => {
-    if (!allFiles) return [];
-    const types = Array.from(new Set(allFiles.map(f => f.file_type).filter(Boolean)));
-    return types.sort();
-  }, [allFiles]);
+    if (!stats) return [];
+    return stats.file_types.map(t => t.file_type).filter(Boolean);
+  }, [stats]);
 
   const filters: FileFilters = useMemo(() => {
     return appliedFilters;
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { File as FileType, FileFilters } from '../types/file';
+import { File as FileType, FileFilters, FileStats } from '../types/file';
 
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000/api';
 
@@ -51,6 +51,11 @@ export const fileService = {
     return response.data;
   },
 
+  async getStats(): Promise<FileStats> {
+    const response = await axios.get(`${API_URL}/files/stats/`);
+    return response.data;
+  },
+
   async deleteFile(id: string): Promise<void> {
     await axios.delete(`${API_URL}/files/${id}/`);
   },
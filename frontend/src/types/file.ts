@@ -6,6 +6,8 @@ export interface File {
   uploaded_at: string;
   file: string;
   content_hash: string | null;
+  // Only present on upload and detail responses
+  fingerprint?: string | null;
   is_duplicate: boolean;
   reference_count: number;
   referenced_file_id: string | null;
@@ -18,4 +20,14 @@ export interface FileFilters {
   size_max?: number;
   uploaded_after?: string;
   uploaded_before?: string;
-} 
\ No newline at end of file
+}
+
+export interface FileTypeCount {
+  file_type: string;
+  count: number;
+}
+
+export interface FileStats {
+  total: number;
+  file_types: FileTypeCount[];
+}